@@ -1,42 +1,197 @@
 import asyncio
+import io
+import json
 import re
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
+from functools import lru_cache, partial
+from operator import itemgetter
 from zoneinfo import ZoneInfo  # For Python 3.9+ (if using an earlier version, use pytz)
-from typing import List, Tuple, Any
+from typing import AsyncIterator, List, Tuple, Any
 from telethon import TelegramClient, types
 from telethon.errors.rpcerrorlist import MsgIdInvalidError
-from tqdm import tqdm
+from tqdm.asyncio import tqdm_asyncio
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import hyperscan
+except ImportError:
+    hyperscan = None
+
+# Records carry the message date first so the save functions can sort with a
+# C-level itemgetter key instead of a Python lambda per comparison.
+PostRecord = Tuple[datetime, Any, types.Message, str]  # (date, entity, post, group_username)
+CommentRecord = Tuple[datetime, Any, types.Message, str, types.Message]  # (date, entity, comment, group_username, post)
+
+# Substitution template for keyword highlighting; \g<0> keeps the matched
+# text so re.sub runs without a Python callback per match.
+HIGHLIGHT_TPL: str = r'<span style="background-color: yellow; color: black; font-weight: bold;">\g<0></span>'
+
+# Record templates built once at module scope; the save loops fill them with
+# format_map instead of assembling several f-strings per record.
+TIME_FMT: str = '%Y-%m-%d %H:%M:%S'
+POST_TPL: str = ("### Group: {group}\n"
+                 "**Date:** {date} (Kyiv)\n\n"
+                 "**Post:**\n\n"
+                 "{text}\n\n"
+                 "[Post Link]({link})\n\n"
+                 "---\n\n")
+COMMENT_TPL: str = ("### Group: {group}\n"
+                    "**Comment Date:** {date} (Kyiv)\n\n"
+                    "**Comment:**\n\n"
+                    "{text}\n\n"
+                    "[Comment Link]({link})\n\n"
+                    "---\n\n")
+
+# Intermediate record files: the fetch phase appends cheap JSON lines here and
+# Markdown is rendered from them in a separate step, so partial results survive
+# an interrupted run and the fetch pipeline never blocks on string work.
+POSTS_JSONL: str = 'posts.jsonl'
+COMMENTS_JSONL: str = 'comments.jsonl'
+
+# 1 MiB write buffer: large enough to batch syscalls well (the text-mode
+# default is ~8 KiB) without hogging memory.
+WRITE_BUFFER_SIZE: int = 1 << 20
+
+
+def _open_buffered(path: str) -> io.BufferedWriter:
+    """
+    Opens a file for binary writing behind an explicit 1 MiB BufferedWriter,
+    bypassing TextIOWrapper so no per-write transcoding happens.
+    """
+    return io.BufferedWriter(open(path, 'wb', buffering=0), buffer_size=WRITE_BUFFER_SIZE)
+
+
+# Below this many records, rendering stays in-process: worker startup and
+# record pickling would cost more than the rendering itself.
+RENDER_POOL_MIN_RECORDS: int = 1000
+
+
+@lru_cache(maxsize=None)
+def _worker_pattern(pattern_source: str) -> re.Pattern:
+    """
+    Compiles the keyword pattern once per worker process.
+    """
+    return re.compile(pattern_source, re.IGNORECASE)
+
+
+def _render_record(record: dict, template: str, pattern_source: str, tz_key: str) -> str:
+    """
+    Renders one record dict to its Markdown block. Module-level and driven by
+    plain picklable arguments so it can also run in worker processes.
+    """
+    pattern: re.Pattern = _worker_pattern(pattern_source)
+    record_time: datetime = datetime.fromisoformat(record['date']).astimezone(ZoneInfo(tz_key))
+    text: str = record['text']
+    if pattern.search(text) is not None:
+        text = pattern.sub(HIGHLIGHT_TPL, text)
+    return template.format_map({'group': record['group'],
+                                'date': record_time.strftime(TIME_FMT),
+                                'text': text,
+                                'link': record['link']})
+
+
+def _dump_record(record: dict) -> bytes:
+    """
+    Encodes one record as a JSON line (orjson when available).
+    """
+    if orjson is not None:
+        return orjson.dumps(record, option=orjson.OPT_APPEND_NEWLINE)
+    return json.dumps(record, ensure_ascii=False).encode('utf-8') + b'\n'
+
+
+def _load_record(line: bytes) -> dict:
+    """
+    Decodes one JSON line back into a record dict.
+    """
+    return orjson.loads(line) if orjson is not None else json.loads(line)
 
 
 class TelegramChecker:
     def __init__(self, api_id: int, api_hash: str, groups: List[str], keywords: List[str],
-                 time_filter: int = 0) -> None:
+                 time_filter: int = 0, comments_for_matching_only: bool = True) -> None:
         """
         :param api_id: API ID for Telethon.
         :param api_hash: API Hash for Telethon.
         :param groups: List of groups (public usernames or group IDs).
         :param keywords: List of keywords for filtering.
         :param time_filter: Number of hours for filtering posts. If 0, then for today.
+        :param comments_for_matching_only: If True (default), comments are only fetched
+            for posts that themselves contain a keyword. If False, comments are fetched
+            for every post, so a matching comment under a non-matching post is also saved.
         """
         self.api_id: int = api_id
         self.api_hash: str = api_hash
         self.groups: List[str] = groups
         self.keywords: List[str] = keywords
+        # Lowercased once here instead of per message in the filter loops.
+        self._kw_lower: List[str] = [keyword.lower() for keyword in keywords]
         self.time_filter: int = time_filter  # if 0, filter by today's date
+        self.comments_for_matching_only: bool = comments_for_matching_only
         self.tz: ZoneInfo = ZoneInfo("Europe/Kyiv")
+        # Compiled once and reused for both keyword matching and highlighting.
+        # An empty keyword list gets a never-matching pattern so nothing matches.
+        if keywords:
+            self._kw_pattern: re.Pattern = re.compile(
+                "|".join(re.escape(keyword) for keyword in keywords), re.IGNORECASE)
+        else:
+            self._kw_pattern = re.compile(r"(?!)")
+        # Aho-Corasick automaton: scans a text in O(len(text)) regardless of
+        # the number of keywords. Used for membership tests when available.
+        self._ac: Any = None
+        if ahocorasick is not None and keywords:
+            self._ac = ahocorasick.Automaton()
+            for keyword, keyword_lower in zip(keywords, self._kw_lower):
+                self._ac.add_word(keyword_lower, keyword)
+            self._ac.make_automaton()
+        # Hyperscan database: all keywords compiled into one SIMD-accelerated
+        # DFA. Optional — matching falls back to Aho-Corasick, then to the
+        # compiled regex, when it is not installed or fails to compile.
+        self._hs_db: Any = None
+        if hyperscan is not None and keywords:
+            try:
+                self._hs_db = hyperscan.Database()
+                self._hs_db.compile(
+                    # Keywords are literals, so regex metacharacters are escaped
+                    expressions=[re.escape(keyword).encode('utf-8') for keyword in keywords],
+                    ids=list(range(len(keywords))),
+                    flags=[hyperscan.HS_FLAG_CASELESS | hyperscan.HS_FLAG_UTF8] * len(keywords))
+            except Exception as e:
+                print(f"Failed to build the hyperscan database, falling back: {e}")
+                self._hs_db = None
 
-    @staticmethod
-    def highlight_keywords(text: str, keywords: List[str]) -> str:
+    def _contains_keyword(self, text: str) -> bool:
+        """
+        Returns True if the text contains at least one keyword (case-insensitive).
+        """
+        if self._hs_db is not None:
+            matched: List[bool] = [False]
+            self._hs_db.scan(text.encode('utf-8'),
+                             match_event_handler=lambda *args: matched.__setitem__(0, True))
+            return matched[0]
+        if self._ac is not None:
+            return next(self._ac.iter(text.lower()), None) is not None
+        return self._kw_pattern.search(text) is not None
+
+    def highlight_keywords(self, text: str) -> str:
         """
         Highlights found keywords using an HTML <span> tag with a yellow background,
         black text color, and bold font.
         """
-        pattern: re.Pattern = re.compile("|".join(re.escape(keyword) for keyword in keywords), re.IGNORECASE)
-
-        def repl(match: re.Match) -> str:
-            return f'<span style="background-color: yellow; color: black; font-weight: bold;">{match.group(0)}</span>'
-
-        return pattern.sub(repl, text)
+        # A search is much cheaper than a substitution pass; texts without a
+        # hit (possible on the comment path) are returned untouched
+        if self._kw_pattern.search(text) is None:
+            return text
+        return self._kw_pattern.sub(HIGHLIGHT_TPL, text)
 
     def _get_time_filter(self) -> datetime:
         """
@@ -50,124 +205,228 @@ class TelegramChecker:
         else:
             return now - timedelta(hours=self.time_filter)
 
-    async def fetch_posts(self, client: TelegramClient) -> List[Tuple[Any, types.Message, str]]:
+    async def _fetch_group_posts(self, client: TelegramClient, group_username: str,
+                                 threshold_ts: float,
+                                 sem: asyncio.Semaphore) -> List[PostRecord]:
         """
-        Fetches all top-level messages (posts) from all groups for the selected period.
-        Returns a list of tuples (entity, post, group_username).
+        Fetches all top-level messages (posts) from a single group for the selected period.
+        Returns a list of tuples (date, entity, post, group_username).
         """
-        time_threshold: datetime = self._get_time_filter()
-        posts: List[Tuple[Any, types.Message, str]] = []
-        for group_username in self.groups:
+        posts: List[PostRecord] = []
+        async with sem:
+            print(f"Processing group: {group_username}")
             try:
-                entity: Any = await client.get_entity(group_username)
-                print(f"Processing group: {group_username}")
+                # iter_messages resolves the username itself, so the separate
+                # get_entity round trip per group is unnecessary; the entity is
+                # taken from msg.chat, which Telethon fills from the same response
+                async for msg in client.iter_messages(group_username):
+                    # Epoch floats compare without any tz-aware datetime
+                    # machinery; conversion to Kyiv time happens only when
+                    # formatting output
+                    if msg.date.timestamp() < threshold_ts:
+                        break
+                    # Top-level message (not a reply)
+                    if msg.reply_to_msg_id is None:
+                        posts.append((msg.date, msg.chat, msg, group_username))
             except Exception as e:
                 print(f"Failed to access group {group_username}: {e}")
-                continue
-
-            async for msg in client.iter_messages(entity):
-                msg_time: datetime = msg.date.astimezone(self.tz)
-                if msg_time < time_threshold:
-                    break
-                # Top-level message (not a reply)
-                if msg.reply_to_msg_id is None:
-                    posts.append((entity, msg, group_username))
-        print(f"Found {len(posts)} posts for the specified period.")
         return posts
 
-    def filter_posts_by_keywords(self, posts: List[Tuple[Any, types.Message, str]]) -> List[
-        Tuple[Any, types.Message, str]]:
+    async def fetch_posts(self, client: TelegramClient) -> AsyncIterator[PostRecord]:
+        """
+        Streams all top-level messages (posts) from all groups for the selected period.
+        Groups are fetched concurrently (bounded to avoid flood-wait limits) and
+        posts are yielded as each group completes, so the consumer can filter and
+        write while the remaining groups are still downloading.
+        Yields tuples (date, entity, post, group_username).
+        """
+        threshold_ts: float = self._get_time_filter().timestamp()
+        sem: asyncio.Semaphore = asyncio.Semaphore(8)
+        tasks: List[asyncio.Task] = [
+            asyncio.create_task(self._fetch_group_posts(client, group_username, threshold_ts, sem))
+            for group_username in self.groups
+        ]
+        total: int = 0
+        for task in asyncio.as_completed(tasks):
+            try:
+                group_posts: List[PostRecord] = await task
+            except Exception as e:
+                print(f"Failed to fetch posts for a group: {e}")
+                continue
+            total += len(group_posts)
+            for item in group_posts:
+                yield item
+        print(f"Found {total} posts for the specified period.")
+
+    def filter_posts_by_keywords(self, posts: List[PostRecord]) -> List[PostRecord]:
         """
         Filters posts to retain only those that contain at least one keyword.
         Returns a list of posts that meet the condition.
         """
-        filtered: List[Tuple[Any, types.Message, str]] = []
-        for entity, post, group_username in posts:
-            if post.text and any(keyword.lower() in post.text.lower() for keyword in self.keywords):
-                filtered.append((entity, post, group_username))
-        return filtered
-
-    def save_posts(self, posts: List[Tuple[Any, types.Message, str]]) -> None:
-        """
-        Saves the given list of posts to the Markdown file 'saved_posts.md'.
-        """
-        # Sort posts by date (from oldest to newest)
-        posts.sort(key=lambda x: x[1].date)
-        with open('saved_posts.md', 'w', encoding='utf-8') as f:
-            for entity, post, group_username in posts:
-                post_time: datetime = post.date.astimezone(self.tz)
-                highlighted_text: str = self.highlight_keywords(post.text, self.keywords)
-                if hasattr(entity, 'username') and entity.username:
-                    post_link: str = f"https://t.me/{entity.username}/{post.id}"
-                else:
-                    post_link = "No public link"
-                f.write(f"### Group: {group_username}\n")
-                f.write(f"**Date:** {post_time.strftime('%Y-%m-%d %H:%M:%S')} (Kyiv)\n\n")
-                f.write("**Post:**\n\n")
-                f.write(f"{highlighted_text}\n\n")
-                f.write(f"[Post Link]({post_link})\n\n")
-                f.write("---\n\n")
-        print(f"Saved {len(posts)} posts with keywords in 'saved_posts.md'.")
-
-    async def fetch_comments(self, client: TelegramClient, posts: List[Tuple[Any, types.Message, str]]) -> List[
-        Tuple[Any, types.Message, str, types.Message]]:
-        """
-        For each of the given posts, fetches all replies (comments).
-        Returns a list of tuples (entity, comment, group_username, post) for comments
-        that contain at least one keyword.
-        """
-        comments: List[Tuple[Any, types.Message, str, types.Message]] = []
-        for entity, post, group_username in tqdm(posts, desc="Collecting comments"):
-            # Skip if the post does not support comments
-            if post.replies is None:
-                continue
+        # The message sits at index 2 of a PostRecord; indexing directly keeps
+        # the comprehension free of per-record tuple unpacking
+        return [p for p in posts if p[2].text and self._contains_keyword(p[2].text)]
+
+    @staticmethod
+    def _link_prefix(entity: Any, cache: dict) -> Any:
+        """
+        Returns the 'https://t.me/<username>' prefix for an entity, or None if it
+        has no public username. Cached per entity id, since there are far fewer
+        distinct entities than records.
+        """
+        key: Any = getattr(entity, 'id', id(entity))
+        if key not in cache:
+            username: Any = getattr(entity, 'username', None)
+            cache[key] = f"https://t.me/{username}" if username else None
+        return cache[key]
+
+    def _post_record(self, record: PostRecord, link_prefixes: dict) -> dict:
+        """
+        Converts a post tuple into the flat dict persisted to posts.jsonl.
+        """
+        post_date, entity, post, group_username = record
+        prefix: Any = self._link_prefix(entity, link_prefixes)
+        return {'group': group_username,
+                'date': post_date.isoformat(),
+                'text': post.text,
+                'link': f"{prefix}/{post.id}" if prefix else "No public link"}
+
+    def _comment_record(self, record: CommentRecord, link_prefixes: dict) -> dict:
+        """
+        Converts a comment tuple into the flat dict persisted to comments.jsonl.
+        """
+        comment_date, entity, comment, group_username, post = record
+        prefix: Any = self._link_prefix(entity, link_prefixes)
+        return {'group': group_username,
+                'date': comment_date.isoformat(),
+                'text': comment.text,
+                'link': f"{prefix}/{post.id}?comment={comment.id}" if prefix else "No public link"}
+
+    def _render_jsonl(self, jsonl_path: str, out_path: str, template: str) -> int:
+        """
+        Renders one Markdown file from a JSONL record file.
+        Records are sorted by date (ISO-8601 strings in one timezone sort
+        chronologically) and written out in a single pass.
+        Returns the number of rendered records.
+        """
+        try:
+            with open(jsonl_path, 'rb') as f:
+                records: List[dict] = [_load_record(line) for line in f if line.strip()]
+        except FileNotFoundError:
+            return 0
+        records.sort(key=itemgetter('date'))
+        render = partial(_render_record, template=template,
+                         pattern_source=self._kw_pattern.pattern, tz_key=str(self.tz))
+        # Highlighting and formatting are pure CPU work on independent records,
+        # so large batches are rendered across processes; sort order is
+        # preserved because pool.map yields results in input order
+        if len(records) >= RENDER_POOL_MIN_RECORDS:
+            with ProcessPoolExecutor() as pool, _open_buffered(out_path) as f:
+                for block in pool.map(render, records, chunksize=64):
+                    f.write(block.encode('utf-8'))
+        else:
+            # Records go straight through a 1 MiB BufferedWriter; the buffer
+            # batches the syscalls
+            with _open_buffered(out_path) as f:
+                for record in records:
+                    f.write(render(record).encode('utf-8'))
+        return len(records)
+
+    def render_markdown(self) -> None:
+        """
+        Renders 'saved_posts.md' and 'saved_comments.md' from the JSONL records
+        produced by the fetch phase. Can be re-run on its own against the
+        record files of a previous (or interrupted) run.
+        """
+        saved_posts: int = self._render_jsonl(POSTS_JSONL, 'saved_posts.md', POST_TPL)
+        print(f"Saved {saved_posts} posts with keywords in 'saved_posts.md'.")
+        saved_comments: int = self._render_jsonl(COMMENTS_JSONL, 'saved_comments.md', COMMENT_TPL)
+        print(f"Saved {saved_comments} comments with keywords in 'saved_comments.md'.")
+
+    async def _fetch_post_comments(self, client: TelegramClient, entity: Any, post: types.Message,
+                                   group_username: str, sem: asyncio.Semaphore,
+                                   queue: asyncio.Queue) -> None:
+        """
+        Fetches all replies (comments) for a single post and pushes those that
+        contain at least one keyword onto the queue as
+        (date, entity, comment, group_username, post) tuples.
+        """
+        async with sem:
             try:
                 async for reply in client.iter_messages(entity, reply_to=post.id):
-                    comments.append((entity, reply, group_username, post))
+                    if reply.text and self._contains_keyword(reply.text):
+                        await queue.put((reply.date, entity, reply, group_username, post))
             except MsgIdInvalidError as e:
                 print(f"Skipping post {post.id} from group {group_username} due to error: {e}")
-                continue
 
-        # Filter comments by keywords
-        filtered_comments: List[Tuple[Any, types.Message, str, types.Message]] = []
-        for entity, reply, group_username, post in comments:
-            if reply.text and any(keyword.lower() in reply.text.lower() for keyword in self.keywords):
-                filtered_comments.append((entity, reply, group_username, post))
-        print(f"Found {len(filtered_comments)} comments with keywords for posts in the specified period.")
-        return filtered_comments
-
-    def save_comments(self, comments: List[Tuple[Any, types.Message, str, types.Message]]) -> None:
-        """
-        Saves the given list of comments to the Markdown file 'saved_comments.md'.
-        """
-        # Sort comments by date (from oldest to newest)
-        comments.sort(key=lambda x: x[1].date)
-        with open('saved_comments.md', 'w', encoding='utf-8') as f:
-            for entity, comment, group_username, post in comments:
-                comment_time: datetime = comment.date.astimezone(self.tz)
-                highlighted_text: str = self.highlight_keywords(comment.text, self.keywords)
-                if hasattr(entity, 'username') and entity.username:
-                    comment_link: str = f"https://t.me/{entity.username}/{post.id}?comment={comment.id}"
-                else:
-                    comment_link = "No public link"
-                f.write(f"### Group: {group_username}\n")
-                f.write(f"**Comment Date:** {comment_time.strftime('%Y-%m-%d %H:%M:%S')} (Kyiv)\n\n")
-                f.write("**Comment:**\n\n")
-                f.write(f"{highlighted_text}\n\n")
-                f.write(f"[Comment Link]({comment_link})\n\n")
-                f.write("---\n\n")
-        print(f"Saved {len(comments)} comments with keywords in 'saved_comments.md'.")
+    async def _comment_writer(self, queue: asyncio.Queue) -> int:
+        """
+        Drains comment records from the queue and appends them to
+        comments.jsonl as they arrive, so disk I/O overlaps the network fetch.
+        JSON encoding is cheap; Markdown rendering is deferred to
+        render_markdown. Returns the number of comments written.
+        """
+        written: int = 0
+        link_prefixes: dict = {}
+        with _open_buffered(COMMENTS_JSONL) as f:
+            while True:
+                record: Any = await queue.get()
+                if record is None:
+                    break
+                f.write(_dump_record(self._comment_record(record, link_prefixes)))
+                written += 1
+        return written
+
+    async def fetch_comments(self, client: TelegramClient, posts: List[PostRecord]) -> int:
+        """
+        For each of the given posts, fetches all replies (comments) and records
+        those that contain at least one keyword in comments.jsonl.
+        Posts are fetched concurrently (bounded to avoid flood-wait limits)
+        while a writer task streams matched comments to disk.
+        Returns the number of recorded comments.
+        """
+        sem: asyncio.Semaphore = asyncio.Semaphore(10)
+        queue: asyncio.Queue = asyncio.Queue(maxsize=1000)
+        writer: asyncio.Task = asyncio.create_task(self._comment_writer(queue))
+        results: List[Any] = await tqdm_asyncio.gather(
+            *[self._fetch_post_comments(client, entity, post, group_username, sem, queue)
+              for post_date, entity, post, group_username in posts
+              # Skip if the post does not support comments
+              if post.replies is not None],
+            desc="Collecting comments",
+            return_exceptions=True
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                print(f"Failed to fetch comments for a post: {result}")
+        await queue.put(None)  # signal end of stream to the writer
+        saved: int = await writer
+        print(f"Collected {saved} comments with keywords in '{COMMENTS_JSONL}'.")
+        return saved
 
     async def run(self) -> None:
         async with TelegramClient('session_name', self.api_id, self.api_hash) as client:
-            # Fetch posts for the specified period
-            all_posts: List[Tuple[Any, types.Message, str]] = await self.fetch_posts(client)
-            # Filter posts by keywords for saving
-            posts_with_keywords: List[Tuple[Any, types.Message, str]] = self.filter_posts_by_keywords(all_posts)
-            self.save_posts(posts_with_keywords)
-            # Fetch comments for all posts (even if the post does not contain keywords)ls -lag
-            comments: List[Tuple[Any, types.Message, str, types.Message]] = await self.fetch_comments(client, all_posts)
-            self.save_comments(comments)
+            # Fetch posts for the specified period, filtering by keywords on the
+            # fly so matching posts don't have to be re-scanned afterwards
+            all_posts: List[PostRecord] = []
+            posts_with_keywords: List[PostRecord] = []
+            link_prefixes: dict = {}
+            with _open_buffered(POSTS_JSONL) as posts_f:
+                async for record in self.fetch_posts(client):
+                    if not self.comments_for_matching_only:
+                        all_posts.append(record)
+                    post: types.Message = record[2]
+                    if post.text and self._contains_keyword(post.text):
+                        posts_with_keywords.append(record)
+                        posts_f.write(_dump_record(self._post_record(record, link_prefixes)))
+            # Fetch comments only for matching posts by default; with
+            # comments_for_matching_only=False every post is checked, so a
+            # matching comment under a non-matching post is also saved
+            comment_posts: List[PostRecord] = (
+                posts_with_keywords if self.comments_for_matching_only else all_posts)
+            await self.fetch_comments(client, comment_posts)
+            # Render the Markdown files from the collected records
+            self.render_markdown()
 
 
 if __name__ == '__main__':